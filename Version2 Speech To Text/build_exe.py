@@ -3,7 +3,12 @@ import sys
 import subprocess
 import shutil
 import argparse
+import hashlib
+import importlib.util
 import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Setup logging
 logging.basicConfig(
@@ -16,38 +21,43 @@ logging.basicConfig(
 )
 logger = logging.getLogger("build_exe")
 
+# Import name -> pip package name for everything the build needs
+REQUIRED_PACKAGES = {
+    "PyInstaller": "pyinstaller",
+    "vosk": "vosk",
+    "sounddevice": "sounddevice",
+}
+
+# Standard library modules the app never uses, excluded to shrink the bundle
+EXCLUDED_MODULES = ("tkinter.test", "lib2to3", "pydoc_data")
+
+# Native libraries left uncompressed by UPX; they are large and would
+# otherwise be decompressed into memory on every launch
+UPX_EXCLUDE = ("libvosk.dll", "libvosk.so", "libvosk.dylib")
+
+# Model subdirectories Vosk reads when loading a model; other archive entries
+# (READMEs, sample audio, etc.) are not extracted
+MODEL_DIRS = {"am", "conf", "graph", "ivector", "rescore", "rnnlm"}
+
+# Shared HTTP session for model downloads, created on first use by get_session()
+SESSION = None
+
 def check_dependencies():
     """Check if required packages are installed"""
-    try:
-        import pyinstaller
-        logger.info("PyInstaller is installed")
-    except ImportError:
-        logger.error("PyInstaller is not installed. Installing...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "pyinstaller"])
-    
-    try:
-        import vosk
-        logger.info("Vosk is installed")
-    except ImportError:
-        logger.error("Vosk is not installed. Installing...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "vosk"])
-    
-    try:
-        import pyaudio
-        logger.info("PyAudio is installed")
-    except ImportError:
-        logger.error("PyAudio is not installed. Installing...")
-        
-        if sys.platform == 'win32':
-            logger.info("Windows platform detected, installing PyAudio via pipwin")
-            try:
-                import pipwin
-            except ImportError:
-                subprocess.check_call([sys.executable, "-m", "pip", "install", "pipwin"])
-            
-            subprocess.check_call([sys.executable, "-m", "pipwin", "install", "pyaudio"])
+    # find_spec locates a package without importing it, so the native
+    # libraries behind vosk and sounddevice are not loaded just to probe for them
+    missing = []
+    for module, package in REQUIRED_PACKAGES.items():
+        if importlib.util.find_spec(module) is not None:
+            logger.info(f"{package} is installed")
         else:
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "pyaudio"])
+            logger.error(f"{package} is not installed")
+            missing.append(package)
+    
+    # One pip run for everything missing instead of one interpreter per package
+    if missing:
+        logger.info(f"Installing: {' '.join(missing)}")
+        subprocess.check_call([sys.executable, "-m", "pip", "install", *missing])
 
 def check_vosk_model(model_path):
     """Check if the Vosk model exists at the specified path"""
@@ -64,12 +74,394 @@ def check_vosk_model(model_path):
         logger.error(f"Error loading Vosk model: {str(e)}")
         return False
 
-def download_vosk_model(model_name="vosk-model-small-en-us-0.15"):
-    """Download a Vosk model if not present"""
+def fast_zlib():
+    """Return the fastest available zlib-compatible module for inflating"""
+    try:
+        from isal import isal_zlib
+        logger.info("Using ISA-L for model extraction")
+        return isal_zlib
+    except ImportError:
+        pass
+    
+    try:
+        from zlib_ng import zlib_ng
+        logger.info("Using zlib-ng for model extraction")
+        return zlib_ng
+    except ImportError:
+        import zlib
+        return zlib
+
+def is_model_entry(filename):
+    """Check whether a zip entry belongs to one of the MODEL_DIRS"""
+    # Entries live under "<model_name>/<subdir>/..." (or "<subdir>/..." in
+    # archives without a top-level folder)
+    return bool(MODEL_DIRS.intersection(filename.rstrip('/').split('/')[:-1][:2]))
+
+def extract_model_zip(model_zip_path, model_dir, max_workers=None):
+    """Extract the model files from a zip, inflating entries concurrently"""
+    import zipfile
+    from tqdm import tqdm
+    
+    with zipfile.ZipFile(model_zip_path, 'r') as zip_ref:
+        all_infos = zip_ref.infolist()
+    
+    infos = [info for info in all_infos if is_model_entry(info.filename)]
+    logger.info(f"Extracting {len(infos)} of {len(all_infos)} archive entries")
+    
+    # Create all directories up front so workers never race on makedirs
+    model_root = os.path.abspath(model_dir)
+    for info in infos:
+        target = os.path.normpath(os.path.join(model_root, *info.filename.split('/')))
+        if not target.startswith(model_root):
+            continue
+        if not info.is_dir():
+            target = os.path.dirname(target)
+        os.makedirs(target, exist_ok=True)
+    
+    files = [info for info in infos if not info.is_dir()]
+    lock = threading.Lock()
+    
+    # zipfile looks up its inflate and checksum functions through these module
+    # globals, so swapping them routes extraction through the faster library
+    default_zlib, default_crc32 = zipfile.zlib, zipfile.crc32
+    zipfile.zlib = fast_zlib()
+    zipfile.crc32 = zipfile.zlib.crc32
+    
+    def extract_one(info):
+        # ZipFile handles are not thread-safe, so each task opens its own
+        with zipfile.ZipFile(model_zip_path, 'r') as zip_ref:
+            zip_ref.extract(info, model_dir)
+        with lock:
+            bar.update(info.file_size)
+    
+    try:
+        with tqdm(desc="Extracting", total=sum(info.file_size for info in files),
+                  unit='iB', unit_scale=True, unit_divisor=1024) as bar, \
+                ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            # Largest entries first so the long inflates start immediately
+            files.sort(key=lambda info: info.file_size, reverse=True)
+            for future in [executor.submit(extract_one, info) for info in files]:
+                future.result()
+    finally:
+        zipfile.zlib, zipfile.crc32 = default_zlib, default_crc32
+
+def read_sidecar(path):
+    """Return the stripped contents of a sidecar file, or None if missing"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+def write_sidecar(path, value):
+    """Persist a single value next to the file it describes"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(value)
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Compute the SHA-256 of a file without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_session():
+    """Return the shared requests session, creating it on first use"""
+    global SESSION
+    if SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
+        SESSION = requests.Session()
+        SESSION.mount('https://', HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=(502, 503, 504)),
+        ))
+        # The model zip is already compressed; don't ask the server to re-encode it
+        SESSION.headers['Accept-Encoding'] = 'identity'
+    return SESSION
+
+class RangeNotSupported(IOError):
+    """Raised when the server answers a range request with the whole file"""
+
+def download_ranges(session, url, path, total_size, etag, desc, num_ranges=4, max_attempts=3):
+    """Download a file as concurrent byte ranges into a preallocated file
+    
+    Completed ranges are recorded in a "<path>.ranges" sidecar, so a later call
+    for the same remote object only fetches the ranges still missing. A range
+    that fails mid-transfer is retried from the last byte written.
+    """
+    from tqdm import tqdm
+    
+    state_path = f"{path}.ranges"
+    state_header = f"{total_size} {etag}"
+    step = -(-total_size // num_ranges)
+    ranges = [(lo, min(lo + step, total_size) - 1) for lo in range(0, total_size, step)]
+    
+    # Resume only if the partial file belongs to the same remote object
+    state = (read_sidecar(state_path) or '').splitlines()
+    if state[:1] == [state_header] and os.path.exists(path) and os.path.getsize(path) == total_size:
+        done = {int(lo) for lo in state[1:]}
+        logger.info(f"Resuming parallel download, {len(done)} of {len(ranges)} ranges already complete")
+    else:
+        done = set()
+        # Preallocate so every range can be written in place at its own offset
+        with open(path, 'wb') as f:
+            f.truncate(total_size)
+        write_sidecar(state_path, state_header)
+    
+    lock = threading.Lock()
+    block_size = 64 * 1024  # 64 Kibibytes
+    
+    def download_range(lo, hi):
+        pos = lo
+        for attempt in range(1, max_attempts + 1):
+            try:
+                response = session.get(url, headers={'Range': f'bytes={pos}-{hi}'}, stream=True)
+                response.raise_for_status()
+                if response.status_code != 206:
+                    response.close()
+                    raise RangeNotSupported("Server ignored range request")
+                
+                # Each range gets its own handle so seeks don't interfere
+                with open(path, 'r+b') as f:
+                    f.seek(pos)
+                    for data in response.iter_content(block_size):
+                        size = f.write(data)
+                        pos += size
+                        with lock:
+                            bar.update(size)
+                if pos != hi + 1:
+                    raise IOError(f"Range {lo}-{hi} ended early at byte {pos}")
+                break
+            except RangeNotSupported:
+                raise
+            except IOError as e:
+                if attempt == max_attempts:
+                    raise
+                logger.warning(f"Range {lo}-{hi} failed ({str(e)}), retrying from byte {pos}")
+        
+        with lock:
+            done.add(lo)
+            write_sidecar(state_path, "\n".join([state_header, *map(str, sorted(done))]))
+    
+    with tqdm(
+        desc=desc,
+        total=total_size,
+        initial=sum(hi - lo + 1 for lo, hi in ranges if lo in done),
+        unit='iB',
+        unit_scale=True,
+        unit_divisor=1024,
+    ) as bar, ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(download_range, lo, hi) for lo, hi in ranges if lo not in done]
+        for future in futures:
+            future.result()
+    
+    os.remove(state_path)
+
+def fetch_model_zip(model_url, model_zip_path, max_attempts=3):
+    """Download the model zip, resuming partial downloads and verifying integrity"""
     import requests
     import zipfile
     from tqdm import tqdm
     
+    session = get_session()
+    etag_path = f"{model_zip_path}.etag"
+    sha_path = f"{model_zip_path}.sha256"
+    model_zip = os.path.basename(model_zip_path)
+    
+    try:
+        head = session.head(model_url, allow_redirects=True)
+        head.raise_for_status()
+        head_headers = head.headers
+        head_ok = True
+    except requests.RequestException as e:
+        # Offline (or HEAD unsupported): keep using a zip already on disk only
+        # if it is known to be complete. Partial downloads have no checksum
+        # sidecar and no central directory, so they fail both checks
+        if os.path.exists(model_zip_path):
+            expected = read_sidecar(sha_path)
+            if expected is not None:
+                usable = expected == file_sha256(model_zip_path)
+            else:
+                usable = zipfile.is_zipfile(model_zip_path)
+            if usable:
+                logger.warning(f"Could not check {model_url} ({str(e)}), using existing model zip")
+                return
+        # Without metadata a ranged or plain GET may still succeed
+        logger.warning(f"HEAD request for {model_url} failed ({str(e)}), continuing without it")
+        head_headers = {}
+        head_ok = False
+    
+    total_size = int(head_headers.get('content-length', 0))
+    # Without a HEAD response, assume the partial file still matches the
+    # remote object; the ranged GET below re-checks the ETag it returns
+    etag = head_headers.get('ETag', '') if head_ok else (read_sidecar(etag_path) or '')
+    accepts_ranges = head_headers.get('Accept-Ranges', '').lower() == 'bytes'
+    attempts = 0
+    
+    while True:
+        have = os.path.getsize(model_zip_path) if os.path.exists(model_zip_path) else 0
+        stored_etag = read_sidecar(etag_path)
+        
+        # With an unknown size a file on disk can't be told apart from a
+        # truncated one; only a checksum recorded after a finished download
+        # vouches for it
+        if total_size:
+            size_ok = have == total_size
+        else:
+            size_ok = read_sidecar(sha_path) is not None
+        
+        if have and size_ok and stored_etag in (None, etag):
+            expected = read_sidecar(sha_path)
+            digest = file_sha256(model_zip_path)
+            if expected is None or digest == expected:
+                write_sidecar(etag_path, etag)
+                write_sidecar(sha_path, digest)
+                logger.info(f"Model downloaded and verified at {model_zip_path}")
+                return
+            logger.warning("Model zip checksum mismatch, downloading again")
+            have = 0
+        elif have and (stored_etag != etag or (head_ok and have > total_size)):
+            # A partial file can only be resumed against the same remote object
+            logger.info("Discarding stale partial download")
+            have = 0
+        
+        if attempts == max_attempts:
+            raise IOError(f"Failed to download {model_url} after {max_attempts} attempts")
+        attempts += 1
+        
+        if os.path.exists(sha_path):
+            os.remove(sha_path)
+        write_sidecar(etag_path, etag)
+        
+        if not have and total_size and accepts_ranges:
+            # Download into a separate file so an interrupted parallel download,
+            # which is full-size but has holes, is never mistaken for a complete one
+            part_path = f"{model_zip_path}.part"
+            logger.info(f"Downloading Vosk model from {model_url} in parallel ranges")
+            try:
+                download_ranges(session, model_url, part_path, total_size, etag, model_zip)
+                os.replace(part_path, model_zip_path)
+                continue
+            except RangeNotSupported:
+                logger.warning("Server ignored range requests, falling back to a single stream")
+                for path in (part_path, f"{part_path}.ranges"):
+                    if os.path.exists(path):
+                        os.remove(path)
+            except IOError as e:
+                # Completed ranges stay recorded next to the .part file, so the
+                # next attempt (or run) only fetches what is still missing
+                logger.warning(f"Parallel download incomplete ({str(e)}), retrying missing ranges")
+                continue
+        
+        headers = {'Range': f'bytes={have}-'} if have else {}
+        response = session.get(model_url, headers=headers, stream=True)
+        response.raise_for_status()
+        
+        if have and response.status_code != 206:
+            logger.info("Server ignored range request, restarting download")
+            have = 0
+        
+        if not head_ok:
+            # The GET response is the only source of metadata without HEAD
+            response_etag = response.headers.get('ETag', '')
+            if have and etag and response_etag and response_etag != etag:
+                logger.info("Remote model changed, restarting download")
+                response.close()
+                response = session.get(model_url, stream=True)
+                response.raise_for_status()
+                response_etag = response.headers.get('ETag', '')
+                have = 0
+            
+            content_range = response.headers.get('Content-Range', '')
+            if have and '/' in content_range and not content_range.endswith('/*'):
+                total_size = int(content_range.rsplit('/', 1)[1])
+            
+            etag = response_etag or etag
+            write_sidecar(etag_path, etag)
+        
+        if not have and not total_size:
+            total_size = int(response.headers.get('content-length', 0))
+        
+        if have:
+            logger.info(f"Resuming download of {model_url} at byte {have}")
+        else:
+            logger.info(f"Downloading Vosk model from {model_url}")
+        
+        block_size = 1024  # 1 Kibibyte
+        
+        with open(model_zip_path, 'ab' if have else 'wb') as f, tqdm(
+            desc=model_zip,
+            total=total_size,
+            initial=have,
+            unit='iB',
+            unit_scale=True,
+            unit_divisor=1024,
+        ) as bar:
+            for data in response.iter_content(block_size):
+                size = f.write(data)
+                bar.update(size)
+        
+        # The server never reported a size; a stream that ended without error
+        # is the best evidence of completeness available
+        if not total_size:
+            total_size = os.path.getsize(model_zip_path)
+
+def stream_extract_model(model_url, model_dir, desc):
+    """Download a model zip and extract it on the fly without saving the archive"""
+    from stream_unzip import stream_unzip
+    from tqdm import tqdm
+    
+    response = get_session().get(model_url, stream=True)
+    response.raise_for_status()
+    total_size = int(response.headers.get('content-length', 0))
+    block_size = 64 * 1024  # 64 Kibibytes
+    
+    # Extract into a scratch directory and move the result into place at the
+    # end, so an interrupted stream never leaves a half-populated model behind
+    scratch_dir = tempfile.mkdtemp(prefix=".extract-", dir=model_dir)
+    scratch_root = os.path.abspath(scratch_dir)
+    
+    try:
+        with tqdm(
+            desc=desc,
+            total=total_size,
+            unit='iB',
+            unit_scale=True,
+            unit_divisor=1024,
+        ) as bar:
+            def body():
+                for data in response.iter_content(block_size):
+                    bar.update(len(data))
+                    yield data
+            
+            for name, size, chunks in stream_unzip(body()):
+                name = name.decode('utf-8')
+                target = os.path.normpath(os.path.join(scratch_root, *name.split('/')))
+                if name.endswith('/') or not is_model_entry(name) or not target.startswith(scratch_root):
+                    # Entries must be drained before the stream can advance
+                    for _ in chunks:
+                        pass
+                    continue
+                
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+        
+        for entry in os.listdir(scratch_dir):
+            destination = os.path.join(model_dir, entry)
+            if os.path.isdir(destination):
+                shutil.rmtree(destination)
+            os.replace(os.path.join(scratch_dir, entry), destination)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+def download_vosk_model(model_name="vosk-model-small-en-us-0.15", keep_zip=False):
+    """Download a Vosk model if not present"""
     model_dir = os.path.join(os.getcwd(), "model")
     
     # Create model directory if it doesn't exist
@@ -79,53 +471,42 @@ def download_vosk_model(model_name="vosk-model-small-en-us-0.15"):
     model_zip = f"{model_name}.zip"
     model_url = f"https://alphacephei.com/vosk/models/{model_zip}"
     model_zip_path = os.path.join(os.getcwd(), model_zip)
-    
-    # Download the model if not already downloaded
-    if not os.path.exists(model_zip_path):
-        logger.info(f"Downloading Vosk model from {model_url}")
-        try:
-            response = requests.get(model_url, stream=True)
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get('content-length', 0))
-            block_size = 1024  # 1 Kibibyte
-            
-            with open(model_zip_path, 'wb') as f, tqdm(
-                desc=model_zip,
-                total=total_size,
-                unit='iB',
-                unit_scale=True,
-                unit_divisor=1024,
-            ) as bar:
-                for data in response.iter_content(block_size):
-                    size = f.write(data)
-                    bar.update(size)
-            
-            logger.info(f"Model downloaded to {model_zip_path}")
-        except Exception as e:
-            logger.error(f"Error downloading model: {str(e)}")
-            return None
-    else:
-        logger.info(f"Model already downloaded at {model_zip_path}")
-    
-    # Extract the model if not already extracted
     extracted_path = os.path.join(model_dir, model_name)
     
-    if not os.path.exists(extracted_path):
-        logger.info(f"Extracting model to {model_dir}")
+    if os.path.exists(os.path.join(extracted_path, "am", "final.mdl")):
+        logger.info(f"Model already extracted at {extracted_path}")
+        return extracted_path
+    
+    # Without a cached zip to reuse, extract straight from the HTTP stream
+    if not keep_zip and not os.path.exists(model_zip_path):
+        logger.info(f"Streaming Vosk model from {model_url} into {model_dir}")
         try:
-            with zipfile.ZipFile(model_zip_path, 'r') as zip_ref:
-                zip_ref.extractall(model_dir)
+            stream_extract_model(model_url, model_dir, model_zip)
             logger.info(f"Model extracted to {model_dir}")
+            return extracted_path
+        except ImportError:
+            logger.info("stream-unzip is not installed, downloading the zip first")
         except Exception as e:
-            logger.error(f"Error extracting model: {str(e)}")
+            logger.error(f"Error streaming model: {str(e)}")
             return None
-    else:
-        logger.info(f"Model already extracted at {extracted_path}")
     
-    return os.path.join(model_dir, model_name)
+    try:
+        fetch_model_zip(model_url, model_zip_path)
+    except Exception as e:
+        logger.error(f"Error downloading model: {str(e)}")
+        return None
+    
+    logger.info(f"Extracting model to {model_dir}")
+    try:
+        extract_model_zip(model_zip_path, model_dir)
+        logger.info(f"Model extracted to {model_dir}")
+    except Exception as e:
+        logger.error(f"Error extracting model: {str(e)}")
+        return None
+    
+    return extracted_path
 
-def build_executable(script_path, output_name=None, one_file=True, console=False, icon=None, include_model=True, model_path=None):
+def build_executable(script_path, output_name=None, one_file=True, console=False, icon=None, include_model=True, model_path=None, upx_dir=None):
     """Build executable using PyInstaller"""
     logger.info("Building executable with PyInstaller")
     
@@ -140,6 +521,17 @@ def build_executable(script_path, output_name=None, one_file=True, console=False
     
     if one_file:
         pyinstaller_args.append("--onefile")
+    else:
+        # Loose .pyc files import without decompressing the PYZ archive
+        pyinstaller_args.append("--noarchive")
+    
+    for module in EXCLUDED_MODULES:
+        pyinstaller_args.append(f"--exclude-module={module}")
+    
+    if upx_dir and os.path.exists(upx_dir):
+        pyinstaller_args.append(f"--upx-dir={upx_dir}")
+        for binary in UPX_EXCLUDE:
+            pyinstaller_args.append(f"--upx-exclude={binary}")
     
     if not console:
         pyinstaller_args.append("--windowed")
@@ -176,7 +568,11 @@ def main():
     parser.add_argument("--output", default=None, help="Output executable name")
     parser.add_argument("--model", default=None, help="Path to Vosk model")
     parser.add_argument("--download-model", action="store_true", help="Download Vosk small model")
-    parser.add_argument("--onedir", action="store_true", help="Create a directory instead of a single file")
+    parser.add_argument("--keep-zip", action="store_true", help="Keep the downloaded model zip for offline reuse")
+    layout = parser.add_mutually_exclusive_group()
+    layout.add_argument("--onedir", action="store_true", help="Create a directory instead of a single file (the default whenever a model is bundled, and one is downloaded when --model is omitted)")
+    layout.add_argument("--onefile", action="store_true", help="Create a single file even when bundling a model")
+    parser.add_argument("--upx-dir", default=None, help="Path to UPX for compressing binaries")
     parser.add_argument("--console", action="store_true", help="Show console window")
     parser.add_argument("--icon", default=None, help="Path to icon file")
     
@@ -188,26 +584,33 @@ def main():
     # Handle model
     model_path = args.model
     if args.download_model or not model_path:
-        downloaded_model = download_vosk_model()
+        downloaded_model = download_vosk_model(keep_zip=args.keep_zip)
         if downloaded_model:
             model_path = downloaded_model
     
+    # A single-file build re-extracts everything, model included, to a temp
+    # directory on every launch, so bundle the model as a directory instead
+    one_file = not args.onedir and (args.onefile or not model_path)
+    if not args.onedir and not one_file:
+        logger.info("Bundling a model, building a directory instead of a single file (use --onefile to override)")
+    
     # Build executable
     exe_path = build_executable(
         script_path=args.script,
         output_name=args.output,
-        one_file=not args.onedir,
+        one_file=one_file,
         console=args.console,
         icon=args.icon,
         include_model=True if model_path else False,
-        model_path=model_path
+        model_path=model_path,
+        upx_dir=args.upx_dir
     )
     
     if exe_path:
         logger.info(f"Build completed successfully. Executable: {exe_path}")
         
         # If using a single file executable, remind about model requirements
-        if not args.onedir and model_path:
+        if one_file and model_path:
             logger.info(
                 "Note: For the single-file executable, you may need to manually copy "
                 f"the model directory to the same location as the executable or "
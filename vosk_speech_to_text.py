@@ -1,13 +1,25 @@
 import os
 import sys
-import json
 import wave
+import queue
 import logging
+import collections
 import threading
 import tkinter as tk
-from tkinter import scrolledtext, messagebox, filedialog
-import pyaudio
-from vosk import Model, KaldiRecognizer
+from tkinter import scrolledtext
+
+# orjson parses recognizer results several times faster; fall back to the
+# standard library when it isn't installed
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# sounddevice, vosk and the tkinter dialogs are imported where first used so
+# the window can appear before PortAudio and libvosk are loaded
+
+# Let Kaldi's math library use every core; must be set before vosk is imported
+os.environ.setdefault("OMP_NUM_THREADS", str(os.cpu_count() or 1))
 
 # Setup logging
 logging.basicConfig(
@@ -19,6 +31,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger("VoskSpeechToText")
 
+# Minimum delay between UI refreshes driven by the recognizer (~30 fps)
+UI_FLUSH_INTERVAL_MS = 33
+
+# Number of lines kept in the debug log widget and how often it is redrawn
+LOG_MAX_LINES = 500
+LOG_FLUSH_INTERVAL_MS = 50
+
+# How often the main thread checks whether the background model load finished
+PRELOAD_POLL_MS = 100
+
 class VoskSpeechToText:
     def __init__(self, root):
         logger.debug("Initializing VoskSpeechToText application")
@@ -31,18 +53,41 @@ class VoskSpeechToText:
         self.is_listening = False
         self.transcription_text = ""
         self.thread = None
+        self.stop_event = None
         self.model = None
+        self.loaded_model_path = None
+        self.preload_thread = None
+        self.preloaded_model = None
         self.recognizer = None
-        self.audio = None
+        self.recognizer_model = None
         self.stream = None
+        self.audio_queue = queue.SimpleQueue()
+        
+        # UI updates from any thread are coalesced here and applied by
+        # _flush_ui_updates, which polls on the main thread every
+        # UI_FLUSH_INTERVAL_MS; worker threads never call into Tk themselves
+        self._pending = {}
+        self._pending_lock = threading.Lock()
         
         # Create GUI elements
         self.create_widgets()
+        self.root.after(UI_FLUSH_INTERVAL_MS, self._flush_ui_updates)
         
         # Configure model path
         self.model_path = os.path.join(os.getcwd(), "model")
         self.check_model_button.config(state=tk.NORMAL)
         
+        # Load the default model in the background so it is ready by the time
+        # the user wants to start listening; Check Model stays disabled until
+        # _on_model_ready so the model is never loaded twice at once
+        preload_path = self.model_path_var.get()
+        if os.path.exists(preload_path):
+            self.check_model_button.config(state=tk.DISABLED)
+            self.preload_thread = threading.Thread(target=self._preload_model, args=(preload_path,))
+            self.preload_thread.daemon = True
+            self.preload_thread.start()
+            self.root.after(PRELOAD_POLL_MS, self._poll_preload)
+        
         logger.debug("Application initialized successfully")
     
     def create_widgets(self):
@@ -115,10 +160,48 @@ class VoskSpeechToText:
         self.log_handler.setLevel(logging.DEBUG)
         logger.addHandler(self.log_handler)
         
+        self._bind_ui_callbacks()
+        
         logger.debug("GUI widgets created successfully")
     
+    def _bind_ui_callbacks(self):
+        """Build the main-thread UI callbacks around the widgets' bound methods
+        
+        The widgets never change after create_widgets, so the callbacks capture
+        their methods once instead of looking them up through self on each call.
+        """
+        end = tk.END
+        compare = self.transcript_text.compare
+        insert = self.transcript_text.insert
+        see = self.transcript_text.see
+        label_config = self.status_label.config
+        indicator_config = self.status_indicator.itemconfig
+        
+        def add_transcript_impl(text):
+            """Implementation of add_transcript to be called from the main thread"""
+            text = text.strip()
+            if text:
+                # Comparing indices is O(1), unlike reading the whole transcript back
+                if compare("end-1c", "!=", "1.0"):
+                    insert(end, " " + text + "\n")
+                else:
+                    insert(end, text + "\n")
+                see(end)
+        
+        def update_status_impl(label, color):
+            """Implementation of update_status to be called from the main thread"""
+            if label is not None:
+                label_config(text=label)
+            if color is not None:
+                indicator_config("indicator", fill=color)
+        
+        self._add_transcript_impl = add_transcript_impl
+        self._update_status_impl = update_status_impl
+    
     def browse_model(self):
         """Open file dialog to select Vosk model directory"""
+        from tkinter import filedialog
+        
         logger.debug("Browsing for model directory")
         model_dir = filedialog.askdirectory(title="Select Vosk Model Directory")
         if model_dir:
@@ -127,6 +210,8 @@ class VoskSpeechToText:
     
     def check_model(self):
         """Check if the Vosk model exists at the specified path"""
+        from tkinter import messagebox
+        
         model_path = self.model_path_var.get()
         logger.debug(f"Checking model at path: {model_path}")
         
@@ -135,9 +220,18 @@ class VoskSpeechToText:
             messagebox.showerror("Model Error", f"Model directory not found: {model_path}")
             return
         
+        if self.model is not None and self.loaded_model_path == model_path:
+            logger.debug("Using already loaded Vosk model")
+            messagebox.showinfo("Model Check", "Vosk model loaded successfully!")
+            self.start_button.config(state=tk.NORMAL)
+            return
+        
         try:
+            from vosk import Model
+            
             logger.debug("Loading Vosk model...")
             self.model = Model(model_path)
+            self.loaded_model_path = model_path
             logger.info("Vosk model loaded successfully")
             messagebox.showinfo("Model Check", "Vosk model loaded successfully!")
             self.start_button.config(state=tk.NORMAL)
@@ -145,8 +239,39 @@ class VoskSpeechToText:
             logger.error(f"Error loading Vosk model: {str(e)}")
             messagebox.showerror("Model Error", f"Failed to load Vosk model: {str(e)}")
     
+    def _preload_model(self, model_path):
+        """Load the Vosk model in a background thread"""
+        try:
+            from vosk import Model
+            
+            logger.debug(f"Preloading Vosk model from {model_path}")
+            # Picked up by _on_model_ready on the main thread
+            self.preloaded_model = (model_path, Model(model_path))
+        except Exception as e:
+            logger.warning(f"Could not preload Vosk model: {str(e)}")
+    
+    def _poll_preload(self):
+        """Wait on the main thread, without blocking it, for the preload to finish"""
+        if self.preload_thread.is_alive():
+            self.root.after(PRELOAD_POLL_MS, self._poll_preload)
+        else:
+            self._on_model_ready()
+    
+    def _on_model_ready(self):
+        """Adopt the preloaded model, if any, and re-enable the model controls"""
+        self.preload_thread = None
+        self.check_model_button.config(state=tk.NORMAL)
+        
+        if self.preloaded_model is not None:
+            self.loaded_model_path, self.model = self.preloaded_model
+            self.preloaded_model = None
+            logger.info("Vosk model preloaded successfully")
+            self.start_button.config(state=tk.NORMAL)
+    
     def start_listening(self):
         """Start the speech recognition thread"""
+        from tkinter import messagebox
+        
         if self.is_listening:
             logger.debug("Already listening, ignoring start request")
             return
@@ -155,13 +280,42 @@ class VoskSpeechToText:
         self.is_listening = True
         self.update_status("Listening...", "green")
         
-        # Initialize PyAudio
         try:
-            self.audio = pyaudio.PyAudio()
-            self.recognizer = KaldiRecognizer(self.model, 16000)
+            import sounddevice as sd
+            from vosk import KaldiRecognizer
+            
+            # Reuse the recognizer across start/stop cycles while the model is
+            # unchanged, but only once the previous session's thread is gone;
+            # it may still be finishing a block on the old recognizer
+            previous_running = self.thread is not None and self.thread.is_alive()
+            if self.recognizer is not None and self.recognizer_model is self.model and not previous_running:
+                self.recognizer.Reset()
+            else:
+                self.recognizer = KaldiRecognizer(self.model, 16000)
+                self.recognizer_model = self.model
+            
+            # A fresh queue per session, so leftover audio is dropped and a
+            # previous thread still winding down can't take this session's blocks
+            self.audio_queue = queue.SimpleQueue()
+            
+            # Open the microphone here rather than in the worker so stop_listening
+            # always finds the stream it has to close; PortAudio then fills the
+            # queue from its own thread
+            self.stream = sd.RawInputStream(
+                samplerate=16000,
+                blocksize=8000,
+                dtype='int16',
+                channels=1,
+                callback=self.audio_callback
+            )
+            self.stream.start()
             
-            # Start recognition thread
-            self.thread = threading.Thread(target=self.recognize_speech)
+            logger.debug("Microphone stream opened")
+            
+            # Start recognition thread with its own stop event, so a quick
+            # Stop/Start can't revive the previous session's loop
+            self.stop_event = threading.Event()
+            self.thread = threading.Thread(target=self.recognize_speech, args=(self.stop_event, self.recognizer, self.audio_queue))
             self.thread.daemon = True
             self.thread.start()
             
@@ -173,6 +327,9 @@ class VoskSpeechToText:
             logger.info("Speech recognition started")
         except Exception as e:
             self.is_listening = False
+            if self.stream:
+                self.stream.close()
+                self.stream = None
             logger.error(f"Error starting speech recognition: {str(e)}")
             messagebox.showerror("Start Error", f"Failed to start speech recognition: {str(e)}")
             self.update_status("Error", "red")
@@ -185,20 +342,18 @@ class VoskSpeechToText:
         
         logger.debug("Stopping speech recognition")
         self.is_listening = False
+        if self.stop_event:
+            self.stop_event.set()
         self.update_status("Stopped", "gray")
         
         # Close audio stream
         if self.stream:
             try:
-                self.stream.stop_stream()
+                self.stream.stop()
                 self.stream.close()
             except Exception as e:
                 logger.error(f"Error closing audio stream: {str(e)}")
-        
-        # Close PyAudio
-        if self.audio:
-            self.audio.terminate()
-            self.audio = None
+            self.stream = None
         
         # Update UI
         self.start_button.config(state=tk.NORMAL)
@@ -207,90 +362,99 @@ class VoskSpeechToText:
         
         logger.info("Speech recognition stopped")
     
-    def recognize_speech(self):
+    def recognize_speech(self, stop_event, recognizer, audio_queue):
         """Main speech recognition function running in a separate thread"""
         logger.debug("Starting speech recognition thread")
         
         try:
-            # Open microphone stream
-            self.stream = self.audio.open(
-                format=pyaudio.paInt16,
-                channels=1,
-                rate=16000,
-                input=True,
-                frames_per_buffer=8000
-            )
-            self.stream.start_stream()
-            
-            logger.debug("Microphone stream opened")
+            # Bind the per-chunk calls once instead of looking them up on every block
+            get_audio = audio_queue.get
+            accept = recognizer.AcceptWaveform
+            result = recognizer.Result
+            partial_result = recognizer.PartialResult
+            add_transcript = self.add_transcript
+            update_partial = self.update_partial
             
             # Main recognition loop
-            while self.is_listening:
+            while not stop_event.is_set():
                 try:
-                    data = self.stream.read(4000, exception_on_overflow=False)
+                    try:
+                        data = get_audio(timeout=0.5)
+                    except queue.Empty:
+                        continue
                     
                     if len(data) == 0:
                         logger.debug("Empty audio data received")
                         continue
                     
-                    if self.recognizer.AcceptWaveform(data):
-                        result = json.loads(self.recognizer.Result())
-                        transcript = result.get("text", "")
+                    if accept(data):
+                        transcript = json_loads(result()).get("text", "")
                         
                         if transcript:
                             logger.debug(f"Recognized: {transcript}")
-                            self.add_transcript(transcript)
+                            add_transcript(transcript)
                     else:
                         # Partial result
-                        partial = json.loads(self.recognizer.PartialResult())
-                        partial_text = partial.get("partial", "")
+                        partial_text = json_loads(partial_result()).get("partial", "")
                         
                         if partial_text:
-                            self.update_partial(partial_text)
+                            update_partial(partial_text)
                 
                 except Exception as e:
                     logger.error(f"Error in recognition loop: {str(e)}")
-                    if not self.is_listening:
+                    if stop_event.is_set():
                         break
             
             logger.debug("Recognition thread exiting")
             
         except Exception as e:
             logger.error(f"Error in speech recognition thread: {str(e)}")
-            self.is_listening = False
-            self.root.after(0, lambda: self.update_status("Error", "red"))
+            # A stale session must not reset the state of a newer one
+            if not stop_event.is_set():
+                self.is_listening = False
+                self.update_status("Error", "red")
+    
+    def audio_callback(self, indata, frames, time_info, status):
+        """Queue raw audio blocks delivered by the PortAudio callback thread"""
+        if status:
+            logger.debug(f"Audio input status: {status}")
+        # indata is only valid during the callback, and vosk's cffi binding
+        # requires bytes for AcceptWaveform, so copy it once here
+        self.audio_queue.put_nowait(bytes(indata))
     
     def add_transcript(self, text):
         """Add transcribed text to the transcript area"""
-        self.root.after(0, lambda: self._add_transcript_impl(text))
-    
-    def _add_transcript_impl(self, text):
-        """Implementation of add_transcript to be called from the main thread"""
-        if text.strip():
-            current_text = self.transcript_text.get("1.0", tk.END).strip()
-            if current_text:
-                self.transcript_text.insert(tk.END, " " + text.strip() + "\n")
-            else:
-                self.transcript_text.insert(tk.END, text.strip() + "\n")
-            self.transcript_text.see(tk.END)
+        with self._pending_lock:
+            self._pending.setdefault("transcript", []).append(text)
     
     def update_partial(self, text):
         """Update the partial result display"""
-        self.root.after(0, lambda: self._update_partial_impl(text))
-    
-    def _update_partial_impl(self, text):
-        """Implementation of update_partial to be called from the main thread"""
-        # Update status to show we're getting partial results
-        self.status_label.config(text=f"Status: Listening... [Partial: {text[:20]}{'...' if len(text) > 20 else ''}]")
+        # Only the latest partial is shown, so it simply overwrites any pending one
+        with self._pending_lock:
+            self._pending["label"] = f"Status: Listening... [Partial: {text[:20]}{'...' if len(text) > 20 else ''}]"
     
     def update_status(self, status_text, color):
         """Update the status display"""
-        self.root.after(0, lambda: self._update_status_impl(status_text, color))
+        with self._pending_lock:
+            self._pending["label"] = f"Status: {status_text}"
+            self._pending["color"] = color
     
-    def _update_status_impl(self, status_text, color):
-        """Implementation of update_status to be called from the main thread"""
-        self.status_label.config(text=f"Status: {status_text}")
-        self.status_indicator.itemconfig("indicator", fill=color)
+    def _flush_ui_updates(self):
+        """Apply all pending UI updates in one pass on the main thread"""
+        # Reschedule first so an error applying updates doesn't stop the polling
+        self.root.after(UI_FLUSH_INTERVAL_MS, self._flush_ui_updates)
+        
+        with self._pending_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+        
+        add_transcript_impl = self._add_transcript_impl
+        for text in pending.get("transcript", ()):
+            add_transcript_impl(text)
+        
+        if "label" in pending or "color" in pending:
+            self._update_status_impl(pending.get("label"), pending.get("color"))
     
     def clear_transcript(self):
         """Clear the transcript text area"""
@@ -299,6 +463,8 @@ class VoskSpeechToText:
     
     def save_transcript(self):
         """Save the transcript to a text file"""
+        from tkinter import messagebox, filedialog
+        
         transcript = self.transcript_text.get("1.0", tk.END).strip()
         if not transcript:
             logger.debug("No transcript to save")
@@ -334,18 +500,31 @@ class TextHandler(logging.Handler):
         self.text_widget.tag_config("WARNING", foreground="orange")
         self.text_widget.tag_config("ERROR", foreground="red")
         self.text_widget.tag_config("CRITICAL", foreground="red", underline=1)
+        self._buf = collections.deque(maxlen=LOG_MAX_LINES)
+        self._dirty = False
+        # The handler is created on the main thread; redraws poll from there so
+        # emit never calls into Tk from a worker thread while holding the
+        # handler lock, which the main thread also needs to log
+        self.text_widget.after(LOG_FLUSH_INTERVAL_MS, self._flush)
     
     def emit(self, record):
-        msg = self.format(record)
-        
-        def append():
-            self.text_widget.config(state=tk.NORMAL)
-            self.text_widget.insert(tk.END, msg + "\n", record.levelname)
-            self.text_widget.see(tk.END)
-            self.text_widget.config(state=tk.DISABLED)
-        
-        # Schedule insertion in the main thread
-        self.text_widget.after(0, append)
+        self._buf.append((self.format(record) + "\n", record.levelname))
+        self._dirty = True
+    
+    def _flush(self):
+        """Redraw the widget from the buffer with one delete and one insert"""
+        self.text_widget.after(LOG_FLUSH_INTERVAL_MS, self._flush)
+        if not self._dirty:
+            return
+        self._dirty = False
+        lines = list(self._buf)
+        
+        self.text_widget.config(state=tk.NORMAL)
+        self.text_widget.delete("1.0", tk.END)
+        # insert() accepts alternating text/tag arguments
+        self.text_widget.insert(tk.END, *[item for line in lines for item in line])
+        self.text_widget.see(tk.END)
+        self.text_widget.config(state=tk.DISABLED)
 
 
 def main():